@@ -5,12 +5,23 @@ This script verifies the entire pipeline from Lambda invocation to CloudWatch lo
 """
 
 import argparse
-import boto3
 import json
 import time
 import sys
 import os
 
+# Test payload, encoded once and shared by every invocation of this run
+TEST_PAYLOAD = {
+    "test_event": True,
+    "message": "CI/CD test event",
+    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    "metadata": {
+        "source": "cicd-test-script",
+        "environment": "test"
+    }
+}
+PAYLOAD_BYTES = json.dumps(TEST_PAYLOAD, separators=(',', ':')).encode()
+
 def parse_args():
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(description='Test the Elastic monitoring setup')
@@ -20,81 +31,80 @@ def parse_args():
     parser.add_argument('--lambda-function', required=True, help='Lambda function to invoke')
     parser.add_argument('--s3-bucket', required=True, help='S3 bucket name')
     parser.add_argument('--wait-time', type=int, default=30, 
-                        help='Time to wait for logs to propagate (default: 30 seconds)')
+                        help='Maximum time to wait for logs to propagate (default: 30 seconds)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Print the test payload and planned checks without contacting AWS')
     return parser.parse_args()
 
 def invoke_lambda(lambda_client, function_name):
     """Invoke Lambda function with a test payload."""
     print(f"Invoking Lambda function: {function_name}")
     
-    test_payload = {
-        "test_event": True,
-        "message": "CI/CD test event",
-        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
-        "metadata": {
-            "source": "cicd-test-script",
-            "environment": "test"
-        }
-    }
-    
     try:
         response = lambda_client.invoke(
             FunctionName=function_name,
-            Payload=json.dumps(test_payload),
+            Payload=PAYLOAD_BYTES,
             InvocationType='RequestResponse'
         )
         
+        # Only the status is checked, so skip downloading the response body
+        response['Payload'].close()
+        
         if response['StatusCode'] >= 200 and response['StatusCode'] < 300:
             print(f"Successfully invoked Lambda function (Status: {response['StatusCode']})")
             return True
         else:
             print(f"Failed to invoke Lambda function. Status code: {response['StatusCode']}")
             return False
-    except Exception as e:
+    except lambda_client.exceptions.ClientError as e:
         print(f"Error invoking Lambda function: {e}")
         return False
 
-def verify_cloudwatch_logs(logs_client, log_group_name, wait_time):
-    """Verify logs were created in CloudWatch."""
-    print(f"Waiting {wait_time} seconds for logs to propagate to CloudWatch...")
-    time.sleep(wait_time)
+def verify_cloudwatch_logs(logs_client, log_group_name, wait_time, start_time):
+    """
+    Verify logs were created in CloudWatch.
+    Polls with exponential backoff (1s, 2s, 4s, capped at 8s) until events newer
+    than start_time appear in any stream or wait_time seconds have elapsed.
+    """
+    print(f"Polling CloudWatch log group {log_group_name} for up to {wait_time} seconds...")
+    paginator = logs_client.get_paginator('filter_log_events')
+    deadline = time.time() + wait_time
+    delay = 1
     
-    print(f"Checking for logs in CloudWatch log group: {log_group_name}")
-    try:
-        # List the log streams
-        response = logs_client.describe_log_streams(
-            logGroupName=log_group_name,
-            orderBy='LastEventTime',
-            descending=True,
-            limit=5
-        )
+    while True:
+        time.sleep(min(delay, max(deadline - time.time(), 0)))
+        delay = min(delay * 2, 8)
         
-        if not response.get('logStreams'):
-            print("No log streams found.")
-            return False
+        try:
+            # Get events written since the Lambda was invoked, across all streams.
+            # A page can be empty while later pages still hold matches, so follow
+            # nextToken until events appear, the streams are exhausted or the
+            # deadline passes.
+            events = []
+            pages = paginator.paginate(
+                logGroupName=log_group_name,
+                startTime=int(start_time * 1000),
+                PaginationConfig={'PageSize': 3}
+            )
+            for page in pages:
+                events.extend(page.get('events', []))
+                if events or time.time() >= deadline:
+                    break
             
-        # Get the most recent log stream
-        log_stream = response['logStreams'][0]['logStreamName']
+            if events:
+                print(f"Found {len(events)} log events:")
+                for event in events:
+                    print(f"  {event.get('message', '')[:100]}...")
+                return True
+        except logs_client.exceptions.ClientError as e:
+            # Keep polling through throttling, fail fast on anything else
+            if e.response['Error']['Code'] != 'ThrottlingException':
+                print(f"Error checking CloudWatch logs: {e}")
+                return False
         
-        # Get events from the log stream
-        events = logs_client.get_log_events(
-            logGroupName=log_group_name,
-            logStreamName=log_stream,
-            limit=10
-        )
-        
-        if not events.get('events'):
-            print(f"No log events found in stream {log_stream}")
+        if time.time() >= deadline:
+            print(f"No new log events found within {wait_time} seconds.")
             return False
-            
-        print(f"Found {len(events['events'])} log events. Most recent:")
-        for event in events['events'][:3]:
-            print(f"  {event.get('message', '')[:100]}...")
-            
-        return True
-    except Exception as e:
-        print(f"Error checking CloudWatch logs: {e}")
-        return False
 
 def verify_s3_bucket(s3_client, bucket_name):
     """Verify the S3 bucket exists and is accessible."""
@@ -103,7 +113,7 @@ def verify_s3_bucket(s3_client, bucket_name):
         s3_client.head_bucket(Bucket=bucket_name)
         print(f"S3 bucket {bucket_name} exists and is accessible.")
         return True
-    except Exception as e:
+    except s3_client.exceptions.ClientError as e:
         print(f"Error accessing S3 bucket: {e}")
         return False
 
@@ -111,25 +121,52 @@ def main():
     """Main test function."""
     args = parse_args()
     
-    # Create AWS clients
-    session = boto3.Session(region_name=args.region)
-    lambda_client = session.client('lambda')
-    logs_client = session.client('logs')
-    s3_client = session.client('s3')
+    # Dry run: show the planned checks and stop before touching AWS
+    if args.dry_run:
+        print(f"Would verify S3 bucket: {args.s3_bucket}")
+        print(f"Would invoke Lambda function {args.lambda_function} with payload:")
+        print(PAYLOAD_BYTES.decode())
+        print(f"Would poll CloudWatch log group {args.log_group} for up to {args.wait_time} seconds")
+        return 0
     
-    # Step 1: Verify S3 bucket
-    if not verify_s3_bucket(s3_client, args.s3_bucket):
-        print("S3 bucket verification failed")
-        return 1
-        
-    # Step 2: Invoke Lambda function
-    if not invoke_lambda(lambda_client, args.lambda_function):
-        print("Lambda invocation failed")
-        return 1
+    # Imported here so --help, --dry-run and argument errors don't pay for loading boto3
+    import boto3
+    from botocore.config import Config
+    from botocore.exceptions import BotoCoreError
     
-    # Step 3: Verify CloudWatch logs
-    if not verify_cloudwatch_logs(logs_client, args.log_group, args.wait_time):
-        print("CloudWatch logs verification failed")
+    # Service errors are handled by each step; client-side errors such as missing
+    # credentials or connection failures end the test here
+    try:
+        # Create AWS clients once, reusing connections across calls
+        session = boto3.Session(region_name=args.region)
+        config = Config(
+            max_pool_connections=64,
+            tcp_keepalive=True,
+            retries={'max_attempts': 5, 'mode': 'adaptive'},
+            connect_timeout=3,
+            read_timeout=35  # Just above the Lambda function timeout
+        )
+        lambda_client = session.client('lambda', config=config)
+        logs_client = session.client('logs', config=config)
+        s3_client = session.client('s3', config=config)
+        
+        # Step 1: Verify S3 bucket
+        if not verify_s3_bucket(s3_client, args.s3_bucket):
+            print("S3 bucket verification failed")
+            return 1
+        
+        # Step 2: Invoke Lambda function
+        start_time = time.time()
+        if not invoke_lambda(lambda_client, args.lambda_function):
+            print("Lambda invocation failed")
+            return 1
+        
+        # Step 3: Verify CloudWatch logs
+        if not verify_cloudwatch_logs(logs_client, args.log_group, args.wait_time, start_time):
+            print("CloudWatch logs verification failed")
+            return 1
+    except BotoCoreError as e:
+        print(f"Error talking to AWS: {e}")
         return 1
     
     print("\n✅ All tests passed! The infrastructure is working correctly.")
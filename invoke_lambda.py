@@ -5,13 +5,36 @@ This script allows you to generate test logs for testing your Elastic Agent conf
 """
 
 import argparse
-import boto3
+import atexit
 import json
+import logging
+import logging.handlers
+import queue
 import time
 import datetime
 import sys
 import random
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+logger = logging.getLogger(__name__)
+
+# Random user IDs and actions for more realistic logs, built once per run
+USER_IDS = [f"user-{random.randint(1000, 9999)}" for _ in range(128)]
+ACTIONS = ("login", "logout", "view", "edit", "delete", "create", "update", "download", "upload")
+STATUS_CODES = (200, 201, 204, 400, 401, 403, 404, 500)
+DURATIONS_MS = range(10, 5001)
+
+# Compact JSON for a test payload, filled in with % substitution instead of
+# serializing a dict per invocation. All substituted strings are JSON-safe.
+PAYLOAD_TEMPLATE = (
+    '{"test_event":true,"timestamp":"%s","message":"Test event #%d with %s level","log_level":"%s",'
+    '"metadata":{"source":"invoke_lambda.py","invocation_number":%d,"environment":"test",'
+    '"user_id":"%s","action":"%s","duration_ms":%d,"status_code":%d}}'
+)
+
+# Extra attempts when Lambda throttles us beyond what botocore's retries absorb
+THROTTLE_RETRIES = 3
 
 def parse_args():
     """Parse command line arguments."""
@@ -23,35 +46,73 @@ def parse_args():
     parser.add_argument('--profile', help='AWS profile to use (optional)')
     parser.add_argument('--access-key', help='AWS access key (optional, overrides profile if provided)')
     parser.add_argument('--secret-key', help='AWS secret key (optional, must be provided if access-key is used)')
-    parser.add_argument('--delay', type=float, default=2.0, 
-                       help='Delay between invocations in seconds (default: 2.0)')
+    parser.add_argument('--delay', type=float, default=0.0, 
+                       help='Minimum delay between starting invocations in seconds (default: 0.0)')
+    parser.add_argument('--workers', type=int, default=32,
+                       help='Number of concurrent invocations (default: 32)')
+    parser.add_argument('--async', dest='async_invoke', action='store_true',
+                       help='Invoke asynchronously (InvocationType=Event); function errors are not reported')
+    parser.add_argument('--fanout', type=int,
+                       help='Split invocations into this many batches fanned out by the Lambda itself (default: disabled)')
+    parser.add_argument('--dry-run', action='store_true',
+                       help='Print the payloads to stdout without contacting AWS')
     parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'], 
                         default='INFO', help='Log level to use in the payload (default: INFO)')
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+    if args.fanout is not None and args.fanout < 1:
+        parser.error('--fanout must be at least 1')
+    return args
+
+def utc_timestamp():
+    """Return the current UTC time as an ISO 8601 string with a Z suffix."""
+    return datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+def generate_payloads(count, log_level, timestamp=None):
+    """
+    Generate encoded test payloads with a shared timestamp and random values.
+    Random values for the whole batch are sampled up front from one generator.
+    """
+    if timestamp is None:
+        timestamp = utc_timestamp()
+    
+    rng = random.Random()
+    user_ids = rng.choices(USER_IDS, k=count)
+    actions = rng.choices(ACTIONS, k=count)
+    durations = rng.choices(DURATIONS_MS, k=count)
+    status_codes = rng.choices(STATUS_CODES, k=count)
+    
+    return [
+        (PAYLOAD_TEMPLATE % (
+            timestamp, i, log_level, log_level, i, user_id, action, duration_ms, status_code
+        )).encode()
+        for i, user_id, action, duration_ms, status_code
+        in zip(range(1, count + 1), user_ids, actions, durations, status_codes)
+    ]
 
-def generate_payload(invocation_number, log_level):
-    """Generate a test payload with timestamp and random values."""
-    timestamp = datetime.datetime.utcnow().isoformat() + 'Z'
-    
-    # Random user IDs and actions for more realistic logs
-    user_ids = [f"user-{random.randint(1000, 9999)}" for _ in range(5)]
-    actions = ["login", "logout", "view", "edit", "delete", "create", "update", "download", "upload"]
-    
-    return {
-        "test_event": True,
-        "timestamp": timestamp,
-        "message": f"Test event #{invocation_number} with {log_level} level",
-        "log_level": log_level,
-        "metadata": {
-            "source": "invoke_lambda.py",
-            "invocation_number": invocation_number,
-            "environment": "test",
-            "user_id": random.choice(user_ids),
-            "action": random.choice(actions),
-            "duration_ms": random.randint(10, 5000),
-            "status_code": random.choice([200, 201, 204, 400, 401, 403, 404, 500])
-        }
-    }
+def generate_fanout_payloads(count, fanout, log_level, timestamp=None):
+    """
+    Split count invocations into fanout batches of near-equal size.
+    The Lambda function invokes itself asynchronously for the events in its batch,
+    splitting large batches further.
+    """
+    if timestamp is None:
+        timestamp = utc_timestamp()
+    
+    fanout = min(fanout, count)
+    payloads = []
+    for i in range(fanout):
+        base_index = i * count // fanout
+        payloads.append({
+            "fanout": {
+                "batch_size": (i + 1) * count // fanout - base_index,
+                "base_index": base_index,
+                "log_level": log_level,
+                "timestamp": timestamp
+            }
+        })
+    return payloads
 
 def create_session(args):
     """
@@ -62,91 +123,184 @@ def create_session(args):
     3. Profile specified by --profile argument
     4. Default credential chain (env, credentials file, instance profile, etc.)
     """
-    # Check for environment variables first (for GitHub Actions)
-    aws_access_key = os.environ.get('AWS_ACCESS_KEY_ID')
-    aws_secret_key = os.environ.get('AWS_SECRET_ACCESS_KEY')
+    import boto3
     
-    # Command line args override environment variables
+    session_kwargs = {'region_name': args.region}
+    
+    # Command line args override environment variables (used by GitHub Actions)
     if args.access_key and args.secret_key:
-        aws_access_key = args.access_key
-        aws_secret_key = args.secret_key
-        print(f"Using provided AWS access key and secret key")
-    
-    # If we have explicit keys, use them
-    if aws_access_key and aws_secret_key:
-        return boto3.Session(
-            aws_access_key_id=aws_access_key,
-            aws_secret_access_key=aws_secret_key,
-            region_name=args.region
-        )
-    # Otherwise, try to use profile if specified
+        session_kwargs['aws_access_key_id'] = args.access_key
+        session_kwargs['aws_secret_access_key'] = args.secret_key
+        source = "provided AWS access key and secret key"
+    elif os.environ.get('AWS_ACCESS_KEY_ID') and os.environ.get('AWS_SECRET_ACCESS_KEY'):
+        session_kwargs['aws_access_key_id'] = os.environ['AWS_ACCESS_KEY_ID']
+        session_kwargs['aws_secret_access_key'] = os.environ['AWS_SECRET_ACCESS_KEY']
+        source = "AWS access key from environment"
     elif args.profile:
-        print(f"Using AWS region: {args.region}, profile: {args.profile}")
-        return boto3.Session(profile_name=args.profile, region_name=args.region)
-    # If no profile specified, let boto3 use its default credential resolution
+        session_kwargs['profile_name'] = args.profile
+        source = f"profile: {args.profile}"
+    # Otherwise let boto3 use its default credential resolution
     else:
-        print(f"Using AWS region: {args.region}, default credentials")
-        return boto3.Session(region_name=args.region)
+        source = "default credentials"
+    
+    logger.info(f"Using AWS region: {args.region}, {source}")
+    return boto3.Session(**session_kwargs)
+
+def encode_payload(payload):
+    """Serialize a payload to compact JSON bytes, ready to send as-is."""
+    return json.dumps(payload, separators=(',', ':')).encode()
+
+def invoke_lambda(function_name, payload, lambda_client, async_invoke=False):
+    """
+    Invoke Lambda function with the provided pre-encoded payload.
+    Asynchronous invocations return as soon as the event is queued (status 202),
+    so function errors are not reported back.
+    Throttled invocations are retried with exponential backoff; other errors are raised.
+    The response payload is only kept open when it carries a function error.
+    """
+    for attempt in range(THROTTLE_RETRIES + 1):
+        try:
+            response = lambda_client.invoke(
+                FunctionName=function_name,
+                Payload=payload,
+                InvocationType='Event' if async_invoke else 'RequestResponse'
+            )
+            
+            # Skip downloading a response body we never look at
+            if 'FunctionError' not in response:
+                response['Payload'].close()
+            return response
+        except lambda_client.exceptions.TooManyRequestsException:
+            if attempt == THROTTLE_RETRIES:
+                raise
+            time.sleep(2 ** attempt)
 
-def invoke_lambda(function_name, payload, session):
-    """Invoke Lambda function with the provided payload."""
-    lambda_client = session.client('lambda')
+def setup_logging():
+    """
+    Route log records through a queue to a single listener thread writing to stderr,
+    so worker threads only enqueue records instead of contending on the stream.
+    """
+    log_queue = queue.SimpleQueue()
+    logging.getLogger().addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(logging.INFO)
     
-    try:
-        response = lambda_client.invoke(
-            FunctionName=function_name,
-            Payload=json.dumps(payload),
-            InvocationType='RequestResponse'
-        )
-        return response
-    except Exception as e:
-        print(f"Error invoking Lambda function: {e}")
-        sys.exit(1)
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    listener.start()
+    atexit.register(listener.stop)
 
 def main():
     """Main function to invoke Lambda multiple times."""
     args = parse_args()
+    setup_logging()
+    
+    mode = "asynchronously" if args.async_invoke else "synchronously"
+    if args.fanout:
+        mode = f"via {args.fanout} fan-out batches"
+        args.async_invoke = True
     
-    print(f"Invoking Lambda function '{args.function_name}' {args.count} times")
+    # Generate and encode a unique payload for each invocation up front
+    if args.fanout:
+        payloads = [encode_payload(p) for p in generate_fanout_payloads(args.count, args.fanout, args.log_level)]
+    else:
+        payloads = generate_payloads(args.count, args.log_level)
+    
+    # Dry run: show what would be sent and stop before touching AWS
+    if args.dry_run:
+        for payload in payloads:
+            print(payload.decode())
+        return
+    
+    # Imported here so --help, --dry-run and argument errors don't pay for loading boto3
+    from botocore.config import Config
+    from botocore.exceptions import BotoCoreError, ClientError
+    
+    logger.info(f"Invoking Lambda function '{args.function_name}' {args.count} times {mode}")
     
     # Create AWS session
     try:
         session = create_session(args)
-    except Exception as e:
-        print(f"Error creating AWS session: {e}")
+    except BotoCoreError as e:
+        logger.error(f"Error creating AWS session: {e}")
         sys.exit(1)
     
-    # Invoke Lambda function multiple times
-    for i in range(1, args.count + 1):
-        print(f"Invocation {i} of {args.count}")
-        
-        # Generate a unique payload for this invocation
-        payload = generate_payload(i, args.log_level)
-        
-        # Invoke Lambda function
-        response = invoke_lambda(args.function_name, payload, session)
-        
-        if response['StatusCode'] >= 200 and response['StatusCode'] < 300:
-            print(f"Successfully invoked Lambda function (Status: {response['StatusCode']})")
-            
-            # If there's a function error, show it
-            if 'FunctionError' in response:
-                print(f"Function error: {response['FunctionError']}")
-                payload_response = json.loads(response['Payload'].read().decode())
-                print(f"Error details: {json.dumps(payload_response, indent=2)}")
-        else:
-            print(f"Failed to invoke Lambda function. Status code: {response['StatusCode']}")
+    # One client shared by all worker threads, with a connection pool
+    # large enough that urllib3 does not become the bottleneck and
+    # keep-alive so TLS connections are reused across invocations
+    lambda_client = session.client('lambda', config=Config(
+        max_pool_connections=max(args.workers, 10),
+        tcp_keepalive=True,
+        retries={'max_attempts': 5, 'mode': 'adaptive'},
+        connect_timeout=3,
+        read_timeout=35  # Just above the Lambda function timeout
+    ))
+    
+    # Resolve the function ARN once so each invocation skips name resolution
+    function_arn = args.function_name
+    if not function_arn.startswith('arn:'):
+        try:
+            function_arn = lambda_client.get_function_configuration(
+                FunctionName=args.function_name
+            )['FunctionArn']
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ResourceNotFoundException':
+                logger.error(f"Lambda function not found: {e}")
+                sys.exit(1)
+            logger.warning(f"Could not resolve function ARN, invoking by name: {e}")
+        except BotoCoreError as e:
+            logger.error(f"Could not reach Lambda to resolve the function ARN: {e}")
             sys.exit(1)
+    
+    # Invoke Lambda function concurrently to hide per-call network latency
+    failed = False
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {}
+        for i, payload in enumerate(payloads, start=1):
+            futures[executor.submit(invoke_lambda, function_arn, payload, lambda_client, args.async_invoke)] = i
+            
+            # Optional rate limit between starting invocations
+            if args.delay and i < len(payloads):
+                time.sleep(args.delay)
         
-        # Add a delay between invocations
-        if i < args.count:
-            print(f"Waiting {args.delay} seconds before next invocation...")
-            time.sleep(args.delay)
-    
-    print("\nAll invocations completed. Check CloudWatch logs for Lambda function.")
-    print(f"Logs should be available in log group: /aws/lambda/{args.function_name}")
-    print("\nTo check logs using AWS CLI:")
-    print(f"aws logs filter-log-events --log-group-name /aws/lambda/{args.function_name}")
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                response = future.result()
+            except ClientError as e:
+                logger.error(f"Invocation {i}: Error invoking Lambda function: {e}")
+                
+                # No point sending the remaining invocations to a missing function
+                if e.response['Error']['Code'] == 'ResourceNotFoundException':
+                    executor.shutdown(cancel_futures=True)
+                    sys.exit(1)
+                failed = True
+                continue
+            except BotoCoreError as e:
+                logger.error(f"Invocation {i}: Error invoking Lambda function: {e}")
+                failed = True
+                continue
+            
+            if response['StatusCode'] >= 200 and response['StatusCode'] < 300:
+                logger.info(f"Invocation {i}: Successfully invoked Lambda function (Status: {response['StatusCode']})")
+                
+                # If there's a function error, show it
+                if 'FunctionError' in response:
+                    logger.error(f"Invocation {i}: Function error: {response['FunctionError']}")
+                    payload_response = json.loads(response['Payload'].read().decode())
+                    logger.error(f"Error details: {json.dumps(payload_response, indent=2)}")
+            else:
+                logger.error(f"Invocation {i}: Failed to invoke Lambda function. Status code: {response['StatusCode']}")
+                failed = True
+    
+    if failed:
+        logger.error("\nOne or more invocations failed.")
+        sys.exit(1)
+    
+    logger.info("\nAll invocations completed. Check CloudWatch logs for Lambda function.")
+    logger.info(f"Logs should be available in log group: /aws/lambda/{args.function_name}")
+    logger.info("\nTo check logs using AWS CLI:")
+    logger.info(f"aws logs filter-log-events --log-group-name /aws/lambda/{args.function_name}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
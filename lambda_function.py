@@ -1,6 +1,8 @@
 import json
 import logging
 import os
+import random
+from concurrent.futures import ThreadPoolExecutor
 
 # Configure logging
 log_level = os.environ.get('LOG_LEVEL', 'INFO')
@@ -15,6 +17,105 @@ logging.basicConfig(
 logger = logging.getLogger()
 logger.setLevel(numeric_level)
 
+# Fan-out limits: a batch larger than FANOUT_MAX_LEAF is split into at most
+# FANOUT_BRANCHES child batches, so each invocation sends a bounded number of
+# sub-invokes and finishes well within the function timeout
+FANOUT_MAX_LEAF = 200
+FANOUT_BRANCHES = 10
+FANOUT_WORKERS = 16
+
+# Copies of the actions and status codes in invoke_lambda.py, so fan-out events
+# have the same fields and value ranges as events sent directly by the driver
+ACTIONS = ("login", "logout", "view", "edit", "delete", "create", "update", "download", "upload")
+STATUS_CODES = (200, 201, 204, 400, 401, 403, 404, 500)
+
+# Created lazily and reused across warm invocations
+lambda_client = None
+
+def get_lambda_client():
+    """Return the shared Lambda client, importing boto3 only when fan-out needs it."""
+    global lambda_client
+    if lambda_client is None:
+        import boto3
+        from botocore.config import Config
+        lambda_client = boto3.client('lambda', config=Config(
+            max_pool_connections=FANOUT_WORKERS,
+            retries={'max_attempts': 5, 'mode': 'adaptive'}
+        ))
+    return lambda_client
+
+def generate_event(invocation_number, log_level, timestamp):
+    """Generate a test event matching the payloads sent by invoke_lambda.py."""
+    return {
+        "test_event": True,
+        "timestamp": timestamp,
+        "message": f"Test event #{invocation_number} with {log_level} level",
+        "log_level": log_level,
+        "metadata": {
+            "source": "invoke_lambda.py",
+            "invocation_number": invocation_number,
+            "environment": "test",
+            "user_id": f"user-{random.randint(1000, 9999)}",
+            "action": random.choice(ACTIONS),
+            "duration_ms": random.randint(10, 5000),
+            "status_code": random.choice(STATUS_CODES)
+        }
+    }
+
+def fan_out(batch, function_arn):
+    """
+    Invoke this function asynchronously for the events in the batch.
+    Used by invoke_lambda.py --fanout to spread invocations across Lambdas.
+    Large batches are split into child batches, forming a tree; small ones are
+    sent as individual events. Failed sub-invokes are logged and counted rather
+    than raised, so an async retry never resends events that already went out.
+    """
+    client = get_lambda_client()
+    
+    batch_size = batch['batch_size']
+    base_index = batch.get('base_index', 0)
+    log_level = batch.get('log_level', 'INFO')
+    timestamp = batch.get('timestamp')
+    
+    if batch_size > FANOUT_MAX_LEAF:
+        branches = min(FANOUT_BRANCHES, -(-batch_size // FANOUT_MAX_LEAF))
+        payloads = []
+        for i in range(branches):
+            child_base = base_index + i * batch_size // branches
+            payloads.append({
+                "fanout": {
+                    "batch_size": base_index + (i + 1) * batch_size // branches - child_base,
+                    "base_index": child_base,
+                    "log_level": log_level,
+                    "timestamp": timestamp
+                }
+            })
+    else:
+        payloads = [
+            generate_event(invocation_number, log_level, timestamp)
+            for invocation_number in range(base_index + 1, base_index + batch_size + 1)
+        ]
+    
+    def invoke(payload):
+        try:
+            client.invoke(
+                FunctionName=function_arn,
+                Payload=json.dumps(payload),
+                InvocationType='Event'
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Error invoking fan-out payload: {str(e)}")
+            return False
+    
+    with ThreadPoolExecutor(max_workers=FANOUT_WORKERS) as executor:
+        failures = sum(1 for ok in executor.map(invoke, payloads) if not ok)
+    
+    logger.info(f"Fanned out {len(payloads) - failures} of {len(payloads)} invocations "
+                f"covering events #{base_index + 1} to #{base_index + batch_size}")
+    if failures:
+        logger.error(f"{failures} fan-out invocations failed and were not retried")
+
 def lambda_handler(event, context):
     """
     Simple Lambda function that logs the incoming event.
@@ -23,6 +124,10 @@ def lambda_handler(event, context):
     logger.info(f"Received event: {json.dumps(event)}")
     
     try:
+        # Fan out a batch of invocations requested by invoke_lambda.py
+        if 'fanout' in event:
+            fan_out(event['fanout'], context.invoked_function_arn)
+        
         # Process S3 event
         if 'Records' in event:
             for record in event['Records']:
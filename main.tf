@@ -222,6 +222,26 @@ resource "aws_iam_role_policy_attachment" "lambda_logs" {
   policy_arn = "arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole"
 }
 
+# Allow the Lambda function to invoke itself for fan-out batches
+resource "aws_iam_role_policy" "lambda_self_invoke" {
+  name = "${var.prefix}-lambda-self-invoke"
+  role = aws_iam_role.lambda_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect   = "Allow"
+        Action   = ["lambda:InvokeFunction"]
+        Resource = [
+          aws_lambda_function.log_generator.arn,
+          "${aws_lambda_function.log_generator.arn}:*"
+        ]
+      }
+    ]
+  })
+}
+
 # Lambda function
 resource "aws_lambda_function" "log_generator" {
   function_name    = "${var.prefix}-log-generator"
@@ -239,6 +259,15 @@ resource "aws_lambda_function" "log_generator" {
   }
 }
 
+# Don't retry failed async invocations of this function. This applies to every
+# asynchronous caller (invoke_lambda.py --async, S3 notifications, ...), not just
+# fan-out batches; it is set because a retried fan-out batch would resend events
+# that were already sent
+resource "aws_lambda_function_event_invoke_config" "log_generator" {
+  function_name          = aws_lambda_function.log_generator.function_name
+  maximum_retry_attempts = 0
+}
+
 # Lambda permission to allow S3 to invoke the function
 resource "aws_lambda_permission" "allow_s3" {
   statement_id  = "AllowExecutionFromS3"